@@ -1,73 +1,192 @@
 """fancytail."""
 import click
+import functools
+import heapq
+import io
 import os
 import re
+import selectors
 import sys
+import time
 from collections import deque, OrderedDict
-from datetime import datetime
+from dataclasses import dataclass, field
 from inotify_simple import INotify, flags   # type: ignore
 from pathlib import Path
-from pydantic import BaseModel, ConfigDict
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
-from typing import Optional, TextIO, Tuple, List
+from typing import Any, Dict, Mapping, Optional, Set, TextIO, Tuple, List
 
+try:
+    import hyperscan  # type: ignore
+except ImportError:  # pragma: no cover
+    hyperscan = None  # type: ignore
+
+try:
+    import liburing  # type: ignore
+except ImportError:  # pragma: no cover
+    liburing = None
+
+ERROR_KEYWORDS = ["error", "fail", "exception"]
+ERROR_KEYWORDS_BYTES = [keyword.encode("ascii") for keyword in ERROR_KEYWORDS]
 ERROR_RE = re.compile(r"(error|fail|exception)", re.IGNORECASE)
 COMPACT_FILE_NAME_LENGTH = 20
+TAIL_BLOCK_SIZE = 8192
+MAX_PARTIAL_LINE_SIZE = 64 * 1024
+RING_ENTRIES = 32
 
 
-class WatchedFile(BaseModel):
-    """A file being watched."""
-    model_config = ConfigDict(
-        arbitrary_types_allowed=True
+def _build_hyperscan_db() -> Any:
+    """Compile the error keywords into a hyperscan block database, if hyperscan is available"""
+    if hyperscan is None:
+        return None
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    db.compile(
+        expressions=ERROR_KEYWORDS_BYTES,
+        ids=list(range(len(ERROR_KEYWORDS))),
+        elements=len(ERROR_KEYWORDS),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(ERROR_KEYWORDS),
     )
+    return db
+
+
+ERROR_HS_DB = _build_hyperscan_db()
+
+
+def _stop_on_match(_id: int, start: int, end: int, _flags: int, context: Any) -> bool:
+    # returning True terminates the scan at the first match
+    return True
+
+
+def _hyperscan_match(data: bytes) -> bool:
+    try:
+        ERROR_HS_DB.scan(data, match_event_handler=_stop_on_match)
+    except hyperscan.ScanTerminated:
+        return True
+    return False
+
+
+def _is_error(line: str) -> bool:
+    """
+    Check if a line should be highlighted as an error.
+    A cheap substring prefilter skips the regex for the vast majority of lines.
+    Hyperscan is not used per line, as it only pays off when scanning whole blocks.
+    """
+    low = line.lower()
+    if not ("rror" in low or "ail" in low or "xcept" in low):
+        return False
+    return bool(ERROR_RE.search(line))
+
+
+@functools.lru_cache(maxsize=None)
+def _is_ascii_compatible(encoding: str) -> bool:
+    return all(keyword.encode(encoding) == keyword.encode("ascii") for keyword in ERROR_KEYWORDS)
+
+
+def _may_contain_error(data: bytes, encoding: str) -> bool:
+    """
+    Check if a block of undecoded data may contain error lines, in a single pass over the bytes.
+    If not, the lines in the block do not need to be classified one by one.
+    """
+    if not _is_ascii_compatible(encoding):
+        return True
+    if ERROR_HS_DB is not None:
+        return _hyperscan_match(data)
+    low = data.lower()
+    return any(keyword in low for keyword in ERROR_KEYWORDS_BYTES)
+
+
+def _line_entry(line: str, may_be_error: bool = True) -> Tuple[str, bool]:
+    """Strip the trailing newline once, and classify the line for storing in a WatchedFile"""
+    if line.endswith("\n"):
+        line = line[:-1]
+    return line, may_be_error and _is_error(line)
+
+
+@dataclass(slots=True)
+class WatchedFile:
+    """A file being watched."""
     path: Path
-    last_modified: Optional[datetime] = None
-    last_lines: deque[str] = deque()
-    last_errors: deque[str] = deque()
+    last_modified: Optional[float] = None
+    # lines are stored together with their cached is_error classification
+    last_lines: deque[Tuple[str, bool]] = field(default_factory=deque)
+    # bounded to max_errors, so that old errors are evicted automatically
+    last_errors: deque[str] = field(default_factory=deque)
     fobj: Optional[TextIO] = None
+    # together, the device and inode identify the opened file
+    device: int = 0
+    inode: int = 0
+    # unterminated bytes at the end of the file, kept until the line is completed
+    partial_line: bytes = b""
+    # the last line was ended by a "\r", which may be followed by the "\n" of a "\r\n"
+    after_cr: bool = False
     total_size: int = 10
     max_errors: int = 1
     width: int = 80
     needs_render: bool = True
+    # precomputed file name decorations, which only change with the width
+    _header_row: str = field(default="", init=False, repr=False)
+    _compact_prefix: str = field(default="", init=False, repr=False)
+    _compact_width: int = field(default=0, init=False, repr=False)
+    # _get_size only depends on the total size and the number of errors
+    _size_cache_key: Optional[Tuple[int, int]] = field(default=None, init=False, repr=False)
+    _size_cache_val: Tuple[bool, int, int] = field(default=(False, 0, 0), init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.last_errors = deque(self.last_errors, maxlen=self.max_errors)
+        self._update_decorations()
 
     def set_size(self, total_size: int, max_errors: int, width: int) -> None:
+        if (total_size, max_errors, width) == (self.total_size, self.max_errors, self.width):
+            return
+        if width != self.width:
+            self.width = width
+            self._update_decorations()
+        if max_errors != self.max_errors:
+            self.max_errors = max_errors
+            self.last_errors = deque(self.last_errors, maxlen=max_errors)
         self.total_size = total_size
-        self.max_errors = max_errors
-        self.width = width
         self.needs_render = True
 
-    def update_line(self, line: str) -> None:
+    def _update_decorations(self) -> None:
+        truncated = self.path.name[-COMPACT_FILE_NAME_LENGTH:]
+        self._header_row = f"[bold cyan]==> {self.path.name} <==[/bold cyan]"
+        self._compact_prefix = f"[[bold cyan]{truncated}[/bold cyan]] "
+        self._compact_width = self.width - len(truncated) - 3
+
+    def update_line(self, line: str, may_be_error: bool = True) -> None:
         """
         Add a line to the files buffer.
         Then remove old lines if the buffer is too long.
         For each removed line, check if it is an error to be kept in the error buffer.
+        If may_be_error is False, the line is known not to be an error and is not classified.
         """
-        self.last_lines.append(line)
+        self.last_lines.append(_line_entry(line, may_be_error))
         self._truncate()
         self.needs_render = True
 
     def _truncate(self) -> None:
-        def _usable_size():
-            usable_size = self.total_size - len(self.last_errors)
-            use_header = self.total_size > 2
-            if use_header:
-                usable_size -= 1
-            return usable_size
-
-        usable_size = _usable_size()
+        header_size = 1 if self.total_size > 2 else 0
+        usable_size = self.total_size - header_size - len(self.last_errors)
         if usable_size < 1:
             return
         while len(self.last_lines) > usable_size:
-            popped = self.last_lines.popleft()
-            if ERROR_RE.search(popped):
+            popped, is_error = self.last_lines.popleft()
+            if is_error:
+                # the error buffer takes space from the normal lines, unless an old error is evicted
+                if len(self.last_errors) < self.max_errors:
+                    usable_size -= 1
+                # last_errors has maxlen max_errors, so appending evicts the oldest error when full
                 self.last_errors.append(popped)
-                while len(self.last_errors) > self.max_errors:
-                    self.last_errors.popleft()
-                usable_size = _usable_size()
 
     def _get_size(self) -> Tuple[bool, int, int]:
+        key = (self.total_size, len(self.last_errors))
+        if key != self._size_cache_key:
+            self._size_cache_key = key
+            self._size_cache_val = self._compute_size()
+        return self._size_cache_val
+
+    def _compute_size(self) -> Tuple[bool, int, int]:
         size_left = self.total_size
         use_header = self.total_size > 2
         if use_header:
@@ -78,28 +197,30 @@ class WatchedFile(BaseModel):
         return use_header, normal_lines, error_lines
 
     def render(self, table: Table) -> None:
-        """Render the file's content into a table"""
+        """Render the file's content into a table, as a single row"""
         use_header, normal_lines, error_lines = self._get_size()
+        rows = []
         if use_header:
-            table.add_row(f"[bold cyan]==> {self.path.name} <==[/bold cyan]")
+            rows.append(self._header_row)
             prefix = ""
             usable_width = self.width
         else:
-            truncated = self.path.name[-COMPACT_FILE_NAME_LENGTH:]
-            prefix = f"[[bold cyan]{truncated}[/bold cyan]] "
-            usable_width = self.width - len(truncated) - 3
+            prefix = self._compact_prefix
+            usable_width = self._compact_width
 
         self._truncate()
 
         for line in self.last_errors:
-            line = line.rstrip("\n")[:usable_width]
-            table.add_row(f"{prefix}[red]{line}[/red]")
-        for line in self.last_lines:
-            line = line.rstrip("\n")[:usable_width]
-            if ERROR_RE.search(line):
-                table.add_row(f"{prefix}[red]{line}[/red]")
+            line = line[:usable_width]
+            rows.append(f"{prefix}[red]{line}[/red]")
+        for line, is_error in self.last_lines:
+            line = line[:usable_width]
+            if is_error:
+                rows.append(f"{prefix}[red]{line}[/red]")
             else:
-                table.add_row(f"{prefix}{line}")
+                rows.append(f"{prefix}{line}")
+        # a single multi-line row is much cheaper for rich than one row per line
+        table.add_row("\n".join(rows))
         self.needs_render = False
 
 
@@ -107,88 +228,282 @@ class DirectoryWatcher:
     def __init__(self, path: Path, n: int = 3) -> None:
         self.path = path
         self.n = n
-        self.inotify = INotify()
+        self.inotify = INotify(nonblocking=True)
         mask = flags.CLOSE_WRITE | flags.MODIFY | flags.MOVED_TO
         self.wd = self.inotify.add_watch(path, mask=mask)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.inotify.fileno(), selectors.EVENT_READ)
         self.watched_files: OrderedDict[Path, WatchedFile] = OrderedDict()
-        for file in sorted(path.glob("*")):
-            if file.is_file():
-                self.add_file(file)
-
-    def watch(self) -> None:
-        for event in self.inotify.read(timeout=1000):
-            wd, mask, cookie, name = event
-            path = Path(name)
-            if not path.is_file():
-                continue
-            if mask & flags.MOVED_TO:
-                self.add_file(path)
-                self.update_file(path)
-            elif mask & flags.CLOSE_WRITE or mask & flags.MODIFY:
-                self.update_file(path)
+        # modification times are kept separately from the watched files, for fast selection of the most recent
+        self.mtimes: Dict[Path, float] = {}
+        self.ring = create_ring()
+        # scandir gets the file types from readdir, without a stat per file
+        with os.scandir(path) as it:
+            entries = sorted((entry for entry in it if entry.is_file()), key=lambda entry: entry.name)
+        for entry in entries:
+            self.add_file(Path(entry.path))
+
+    def __enter__(self) -> "DirectoryWatcher":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the watched files, the inotify instance and the io_uring"""
+        for wfile in self.watched_files.values():
+            if wfile.fobj is not None:
+                wfile.fobj.close()
+        self.selector.close()
+        self.inotify.close()
+        close_ring(self.ring)
+        self.ring = None
+
+    def watch(self) -> Set[Path]:
+        """
+        Wait for events, then drain all pending events before updating the files.
+        Multiple events for the same file are coalesced into a single update.
+        Returns the paths of the files that were updated.
+        """
+        # a dict is used as an insertion ordered set
+        dirty: Dict[Path, None] = {}
+        # wake up at least once per second, to follow changes in the terminal size
+        if not self.selector.select(timeout=1.0):
+            return set()
+        events = self.inotify.read(timeout=0)
+        while events:
+            for event in events:
+                wd, mask, cookie, name = event
+                path = self.path / name
+                if not path.is_file():
+                    continue
+                if mask & flags.MOVED_TO:
+                    if path in self.watched_files:
+                        self.replace_file(path)
+                    else:
+                        self.add_file(path)
+                    dirty[path] = None
+                elif mask & flags.CLOSE_WRITE or mask & flags.MODIFY:
+                    dirty[path] = None
+            events = self.inotify.read(timeout=0)
+        self.update_files(list(dirty))
+        return set(dirty)
 
     def add_file(self, path: Path) -> None:
         if path in self.watched_files:
             return
         f = open(path, "r")
-        last_lines = deque(f.readlines()[-self.n:])
+        st = os.fstat(f.fileno())
+        last_lines = deque(_line_entry(line) for line in tail(f, self.n))
+        mtime = path.stat().st_mtime
         self.watched_files[path] = WatchedFile(
             path=path,
-            last_modified=datetime.fromtimestamp(path.stat().st_mtime),
+            last_modified=mtime,
             last_lines=last_lines,
+            fobj=f,
+            device=st.st_dev,
+            inode=st.st_ino,
         )
-        self.watched_files[path].fobj = f
+        self.mtimes[path] = mtime
 
-    def update_file(self, path: Path) -> None:
-        if path not in self.watched_files:
-            self.add_file(path)
+    def replace_file(self, path: Path) -> None:
+        """
+        Reopen a watched file, if another file has been moved in its place.
+        Nothing is done if the file is still the same, based on the device and inode.
+        Content written to the old file before it was replaced is read first, so that it is not lost.
+        """
         wfile = self.watched_files[path]
-        wfile.last_modified = datetime.now()
+        st = os.stat(path)
+        if (st.st_dev, st.st_ino) == (wfile.device, wfile.inode):
+            return
+        self.update_files([path])
         assert wfile.fobj is not None
-        truncated = detect_truncation(wfile.fobj)
-        if truncated:
-            wfile.update_line("[yellow](file truncated)[/yellow]")
-            wfile.fobj.seek(0)
-        # read to the new end of the file
-        while True:
-            line = wfile.fobj.readline()
-            if len(line) == 0:
-                break
+        if wfile.partial_line:
+            # the old file will not be appended to anymore, so its unterminated last line is complete
+            wfile.update_line(wfile.partial_line.decode(wfile.fobj.encoding, "replace"))
+        wfile.fobj.close()
+        f = open(path, "r")
+        wfile.fobj = f
+        st = os.fstat(f.fileno())
+        wfile.device, wfile.inode = st.st_dev, st.st_ino
+        wfile.partial_line = b""
+        wfile.after_cr = False
+        wfile.update_line("[yellow](file replaced)[/yellow]")
+        for line in tail(f, self.n):
             wfile.update_line(line)
 
+    def update_file(self, path: Path) -> None:
+        self.update_files([path])
+
+    def update_files(self, paths: List[Path]) -> None:
+        """
+        Read the new content of the files.
+        The reads for all files are submitted together, using io_uring if liburing is installed.
+        """
+        pending: List[Tuple[WatchedFile, int, int, int]] = []
+        for path in paths:
+            if path not in self.watched_files:
+                self.add_file(path)
+            wfile = self.watched_files[path]
+            now = time.time()
+            wfile.last_modified = now
+            self.mtimes[path] = now
+            assert wfile.fobj is not None
+            fd = wfile.fobj.fileno()
+            offset = os.lseek(fd, 0, os.SEEK_CUR)
+            file_size = os.fstat(fd).st_size
+            if detect_truncation(offset, file_size):
+                wfile.update_line("[yellow](file truncated)[/yellow]")
+                wfile.partial_line = b""
+                wfile.after_cr = False
+                offset = os.lseek(fd, 0, os.SEEK_SET)
+            if file_size > offset:
+                pending.append((wfile, fd, offset, file_size - offset))
+        blocks = read_blocks([(fd, offset, length) for _, fd, offset, length in pending], ring=self.ring)
+        for (wfile, fd, offset, _), data in zip(pending, blocks):
+            assert wfile.fobj is not None
+            os.lseek(fd, offset + len(data), os.SEEK_SET)
+            if wfile.after_cr and data.startswith(b"\n"):
+                # a "\r\n" split between reads, the line was already ended at the "\r"
+                data = data[1:]
+            data = wfile.partial_line + data
+            wfile.after_cr = data.endswith(b"\r")
+            lines, wfile.partial_line = split_complete_lines(data, wfile.fobj.encoding)
+            complete = data[:len(data) - len(wfile.partial_line)]
+            may_be_error = _may_contain_error(complete, wfile.fobj.encoding)
+            for line in lines:
+                wfile.update_line(line, may_be_error)
+
 
-def divide_screen(n_files: int, screen_size: int) -> List[int]:
-    """Divide the screen among the watched files"""
+@functools.lru_cache(maxsize=128)
+def divide_screen(n_files: int, screen_size: int) -> Tuple[int, ...]:
+    """
+    Divide the screen among the watched files.
+    The result is cached, as it is called every tick with mostly the same arguments.
+    """
     if n_files == 0:
-        return []
+        return ()
     if n_files > screen_size:
-        return [1] * screen_size
+        return (1,) * screen_size
     lines_per_file = screen_size // n_files
     extra_lines = screen_size % n_files
-    sizes = [lines_per_file] * n_files
-    for i in range(extra_lines):
-        sizes[i] += 1
-    return sizes
-
-
-def filter_most_recent(watched_files: OrderedDict[Path, WatchedFile], n: int) -> List[Path]:
-    """Return the n most recently modified files, but do not change their ordering"""
-    candidate_files = {key: val for key, val in watched_files.items() if val.last_modified is not None}
-    if n >= len(candidate_files):
-        return list(candidate_files.keys())
-    sorted_files = sorted(candidate_files.items(), key=lambda x: x[1].last_modified, reverse=True)  # type: ignore
-    selected = {x[0] for x in sorted_files[:n]}
-    filtered = [x for x in candidate_files.keys() if x in selected]
+    return (lines_per_file + 1,) * extra_lines + (lines_per_file,) * (n_files - extra_lines)
+
+
+def filter_most_recent(mtimes: Mapping[Path, float], n: int) -> List[Path]:
+    """
+    Return the n most recently modified files, but do not change their ordering.
+    Takes a mapping of modification times in the order of the watched files.
+    """
+    if n >= len(mtimes):
+        return list(mtimes.keys())
+    top = heapq.nlargest(n, mtimes.items(), key=lambda x: x[1])
+    selected = {x[0] for x in top}
+    filtered = [x for x in mtimes.keys() if x in selected]
     return filtered
 
 
-def detect_truncation(fobj: TextIO) -> bool:
+def tail(fobj: TextIO, n: int, block_size: int = TAIL_BLOCK_SIZE) -> List[str]:
     """
-    Detect if the file has been truncated without moving the file pointer.
+    Return the last n complete lines of the file.
+    The file pointer is moved to the start of the trailing partial line, so that it is read once completed.
+    Reads backwards from the end in blocks of doubling size, instead of reading the whole file.
+    """
+    fd = fobj.fileno()
+    file_size = os.fstat(fd).st_size
+    while True:
+        start = max(0, file_size - block_size)
+        data = os.pread(fd, file_size - start, start)
+        # a "\r" at the very end may be the first half of a "\r\n", so that line is not complete yet
+        end = max(data.rfind(b"\n"), data.rfind(b"\r", 0, len(data) - 1)) + 1
+        # one extra newline is needed, to know where the first of the n lines starts
+        if start == 0 or data.count(b"\n", 0, end) > n:
+            break
+        block_size *= 2
+    fobj.seek(start + end)
+    if n <= 0:
+        return []
+    # unless the block starts at the beginning of the file, it starts in the middle of a line
+    first = data.find(b"\n") + 1 if start > 0 else 0
+    return split_lines(data[first:end], fobj.encoding)[-n:]
+
+
+def create_ring() -> Any:
+    """Create an io_uring for batching reads, if liburing is available"""
+    if liburing is None:
+        return None
+    ring = liburing.Ring()
+    liburing.io_uring_queue_init(RING_ENTRIES, ring)
+    return ring
+
+
+def close_ring(ring: Any) -> None:
+    """Release an io_uring created by create_ring"""
+    if ring is not None:
+        liburing.io_uring_queue_exit(ring)
+
+
+def read_blocks(blocks: List[Tuple[int, int, int]], ring: Any = None) -> List[bytes]:
+    """
+    Read a list of (fd, offset, length) blocks.
+    If a ring is given, the reads are submitted together with a single io_uring_enter per RING_ENTRIES blocks.
+    Otherwise falls back to one pread per block.
+    """
+    if ring is None:
+        return [os.pread(fd, length, offset) for fd, offset, length in blocks]
+    result: List[bytes] = []
+    for batch_start in range(0, len(blocks), RING_ENTRIES):
+        batch = blocks[batch_start:batch_start + RING_ENTRIES]
+        buffers = [bytearray(length) for _, _, length in batch]
+        for i, ((fd, offset, _), buf) in enumerate(zip(batch, buffers)):
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_read(sqe, fd, buf, offset)
+            liburing.io_uring_sqe_set_data64(sqe, i)
+        liburing.io_uring_submit_and_wait(ring, len(batch))
+        sizes = [0] * len(batch)
+        error: Optional[OSError] = None
+        cqe = liburing.Cqe()
+        for _ in batch:
+            liburing.io_uring_wait_cqe(ring, cqe)
+            i = cqe[0].user_data
+            try:
+                # the binding raises OSError for a negative result
+                sizes[i] = cqe[0].res
+            except OSError as e:
+                error = error or e
+            liburing.io_uring_cq_advance(ring, 1)
+        # all completions of the batch are consumed before raising, to not leave them for the next call
+        if error is not None:
+            raise error
+        result.extend(bytes(buf[:size]) for buf, size in zip(buffers, sizes))
+    return result
+
+
+def split_complete_lines(data: bytes, encoding: str) -> Tuple[List[str], bytes]:
+    """
+    Split the complete lines in the data, ended by either "\n" or "\r".
+    Returns the lines and the trailing partial line, which should be kept until it is completed.
+    A partial line longer than MAX_PARTIAL_LINE_SIZE is returned as a line instead.
+    """
+    end = max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+    lines = split_lines(data[:end], encoding)
+    partial_line = data[end:]
+    if len(partial_line) > MAX_PARTIAL_LINE_SIZE:
+        lines.append(partial_line.decode(encoding, "replace"))
+        partial_line = b""
+    return lines, partial_line
+
+
+def split_lines(data: bytes, encoding: str) -> List[str]:
+    """Decode and split into lines, with the same newline handling as a file opened in text mode"""
+    return io.StringIO(data.decode(encoding, "replace"), newline=None).readlines()
+
+
+def detect_truncation(offset: int, file_size: int) -> bool:
+    """
+    Detect if the file has been truncated, given the current offset and size.
     Caveat: doesn't work if the file contents change but the length remains the same.
     """
-    offset = os.lseek(fobj.fileno(), 0, os.SEEK_CUR)
-    file_size = os.stat(fobj.fileno()).st_size
     return offset > file_size
 
 
@@ -203,23 +518,30 @@ def detect_truncation(fobj: TextIO) -> bool:
 def main(path: Path, max_errors: int = 1, n: int = 3, max_height: int = -1) -> None:
     watcher = DirectoryWatcher(path, n=n)
     console = Console()
-    with Live(auto_refresh=False) as live:
+    last_layout: Optional[Tuple[Tuple[int, ...], Tuple[Path, ...], int]] = None
+    with watcher, Live(auto_refresh=False) as live:
         while True:
-            watcher.watch()
-            table = Table.grid()
-            table.add_column()
+            dirty = watcher.watch()
             height = max_height if max_height > 0 else console.height
             sizes = divide_screen(n_files=len(watcher.watched_files), screen_size=height)
+            selected = filter_most_recent(watcher.mtimes, len(sizes))
+            layout = (sizes, tuple(selected), console.width)
+            needs_render = not dirty.isdisjoint(selected) or any(
+                watcher.watched_files[path].needs_render for path in selected
+            )
+            if layout == last_layout and not needs_render:
+                # nothing visible has changed, skip building the table
+                continue
+            last_layout = layout
+            table = Table.grid()
+            table.add_column()
             if len(sizes) == 0:
                 table.add_row("[grey30](No files to watch)[/grey30]")
-            needs_render = False
-            for (path, size) in zip(filter_most_recent(watcher.watched_files, len(sizes)), sizes):
+            for (path, size) in zip(selected, sizes):
                 wfile = watcher.watched_files[path]
-                needs_render = needs_render or wfile.needs_render
                 wfile.set_size(total_size=size, max_errors=max_errors, width=console.width)
                 wfile.render(table)
-            if needs_render:
-                live.update(table, refresh=True)
+            live.update(table, refresh=True)
 
 
 if __name__ == "__main__":
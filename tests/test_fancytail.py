@@ -1,13 +1,32 @@
 """Test fancytail module"""
 
+import os
 import pytest
-from collections import OrderedDict
-from datetime import datetime, timedelta
+import time
 from pathlib import Path
 from typing import List
 from unittest.mock import MagicMock
 
-from fancytail.fancytail import WatchedFile, divide_screen, filter_most_recent
+from fancytail import fancytail
+from fancytail.fancytail import (
+    MAX_PARTIAL_LINE_SIZE,
+    DirectoryWatcher,
+    WatchedFile,
+    _is_error,
+    _may_contain_error,
+    close_ring,
+    create_ring,
+    divide_screen,
+    filter_most_recent,
+    read_blocks,
+    split_complete_lines,
+    tail,
+)
+
+
+def _lines(wf: WatchedFile) -> List[str]:
+    """The normal lines of a WatchedFile, without the cached error flags"""
+    return [line for line, _ in wf.last_lines]
 
 
 def test_watched_file_update_line():
@@ -17,26 +36,26 @@ def test_watched_file_update_line():
     # Add normal lines
     wf.update_line("line1\n")
     wf.update_line("line2\n")
-    assert list(wf.last_lines) == ["line1\n", "line2\n"]
+    assert _lines(wf) == ["line1", "line2"]
 
     # Add error line
     wf.update_line("error occurred\n")
-    assert list(wf.last_lines) == ["line1\n", "line2\n", "error occurred\n"]
+    assert _lines(wf) == ["line1", "line2", "error occurred"]
     assert list(wf.last_errors) == []
 
     wf.update_line("line4\n")
     wf.update_line("line5\n")
     # error has not yet scrolled out, so it is sitll in the normal buffer
-    assert list(wf.last_lines) == ["line2\n", "error occurred\n", "line4\n", "line5\n"]
+    assert _lines(wf) == ["line2", "error occurred", "line4", "line5"]
 
     # Add more lines to trigger buffer management
     wf.update_line("line6\n")
     wf.update_line("line7\n")
 
     # There is a a header, a single error, and room for 5-1-1=3 lines in the normal buffer
-    assert len(wf.last_lines) == 3
-    assert "line1\n" not in wf.last_lines
-    assert "error occurred\n" in wf.last_errors
+    assert len(_lines(wf)) == 3
+    assert "line1" not in _lines(wf)
+    assert "error occurred" in wf.last_errors
 
     # errors also scroll out if new errors arrive
     wf.update_line("error 2 occurred\n")
@@ -44,13 +63,56 @@ def test_watched_file_update_line():
     wf.update_line("line9\n")
     wf.update_line("line10\n")
     wf.update_line("line11\n")
-    assert list(wf.last_errors) == ["error occurred\n", "error 2 occurred\n"]
+    assert list(wf.last_errors) == ["error occurred", "error 2 occurred"]
     wf.update_line("error 3 occurred\n")
     wf.update_line("line12\n")
     wf.update_line("line13\n")
     wf.update_line("line14\n")
     wf.update_line("line15\n")
-    assert list(wf.last_errors) == ["error 2 occurred\n", "error 3 occurred\n"]
+    assert list(wf.last_errors) == ["error 2 occurred", "error 3 occurred"]
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("line1\n", False),
+        ("error occurred\n", True),
+        ("An ERROR occurred\n", True),
+        ("Tests FAILED\n", True),
+        ("Traceback: Exception in thread\n", True),
+        ("mail delivered\n", False),
+        ("rror\n", False),
+        ("", False),
+    ]
+)
+def test_is_error(line: str, expected: bool):
+    """Test _is_error function"""
+    assert _is_error(line) == expected
+
+
+@pytest.mark.parametrize(
+    "data, encoding, expected",
+    [
+        (b"line1\nline2\n", "utf-8", False),
+        (b"line1\nAn ERROR occurred\n", "utf-8", True),
+        (b"line1\nTests failed\n", "utf-8", True),
+        (b"mail delivered\n", "utf-8", False),
+        (b"", "utf-8", False),
+        # keywords can not be found in the bytes of encodings that are not ascii compatible
+        ("line1\n".encode("utf-16"), "utf-16", True),
+    ]
+)
+@pytest.mark.parametrize("use_hyperscan", [True, False])
+def test_may_contain_error(
+    data: bytes, encoding: str, expected: bool, use_hyperscan: bool, monkeypatch: pytest.MonkeyPatch
+):
+    """Test _may_contain_error function, both with and without hyperscan"""
+    if use_hyperscan:
+        if fancytail.ERROR_HS_DB is None:
+            pytest.skip("hyperscan not installed")
+    else:
+        monkeypatch.setattr(fancytail, "ERROR_HS_DB", None)
+    assert _may_contain_error(data, encoding) == expected
 
 
 def test_watched_file_set_size():
@@ -62,18 +124,18 @@ def test_watched_file_set_size():
     wf.update_line("line4\n")
     wf.update_line("line5\n")
     # one header, two lines
-    assert list(wf.last_lines) == ["line4\n", "line5\n"]
+    assert _lines(wf) == ["line4", "line5"]
     wf.set_size(total_size=5, max_errors=2, width=80)
-    assert list(wf.last_lines) == ["line4\n", "line5\n"]
+    assert _lines(wf) == ["line4", "line5"]
     wf.update_line("line6\n")
     # one header, three lines 1+3 < 5
-    assert list(wf.last_lines) == ["line4\n", "line5\n", "line6\n"]
+    assert _lines(wf) == ["line4", "line5", "line6"]
     wf.update_line("line7\n")
     # one header, four lines 1+4 == 5
-    assert list(wf.last_lines) == ["line4\n", "line5\n", "line6\n", "line7\n"]
+    assert _lines(wf) == ["line4", "line5", "line6", "line7"]
     wf.update_line("line8\n")
     # one header, four lines 1+4 == 5
-    assert list(wf.last_lines) == ["line5\n", "line6\n", "line7\n", "line8\n"]
+    assert _lines(wf) == ["line5", "line6", "line7", "line8"]
     # add error
     wf.update_line("error occurred\n")
     wf.update_line("line9\n")
@@ -82,8 +144,51 @@ def test_watched_file_set_size():
     # render to trigger truncation
     wf.render(MagicMock())
     # one header, one error, one line
-    assert list(wf.last_errors) == ["error occurred\n"]
-    assert list(wf.last_lines) == ["line10\n"]
+    assert list(wf.last_errors) == ["error occurred"]
+    assert _lines(wf) == ["line10"]
+
+
+def test_watched_file_set_size_needs_render():
+    """Test that WatchedFile.set_size only requests a render if the size changes"""
+    wf = WatchedFile(path=Path("test.log"), total_size=3, max_errors=2, width=80)
+    wf.render(MagicMock())
+    assert not wf.needs_render
+    wf.set_size(total_size=3, max_errors=2, width=80)
+    assert not wf.needs_render
+    wf.set_size(total_size=3, max_errors=2, width=100)
+    assert wf.needs_render
+
+
+def test_watched_file_set_size_width():
+    """Test that changing the width with WatchedFile.set_size affects the compact rendering"""
+    wf = WatchedFile(path=Path("test.log"), total_size=2, max_errors=1, width=80)
+    wf.update_line("123456789ABCDEFGH")
+    wf.set_size(total_size=2, max_errors=1, width=20)
+    table = MagicMock()
+    wf.render(table)
+    table.add_row.assert_called_once_with("[[bold cyan]test.log[/bold cyan]] 123456789")
+
+
+def test_watched_file_get_size():
+    """Test that WatchedFile._get_size follows changes in size and errors"""
+    wf = WatchedFile(path=Path("test.log"), total_size=5, max_errors=2)
+    assert wf._get_size() == (True, 4, 0)
+    wf.set_size(total_size=2, max_errors=2, width=80)
+    assert wf._get_size() == (False, 2, 0)
+    wf.last_errors.append("error occurred\n")
+    assert wf._get_size() == (False, 1, 1)
+
+
+def test_watched_file_set_size_max_errors():
+    """Test that reducing max_errors with WatchedFile.set_size keeps the most recent errors"""
+    wf = WatchedFile(path=Path("test.log"), total_size=5, max_errors=3)
+    for i in range(3):
+        wf.update_line(f"error {i}\n")
+        for j in range(5):
+            wf.update_line(f"line{j}\n")
+    assert list(wf.last_errors) == ["error 0", "error 1", "error 2"]
+    wf.set_size(total_size=5, max_errors=1, width=80)
+    assert list(wf.last_errors) == ["error 2"]
 
 
 def test_watched_file_no_truncate_if_hidden():
@@ -94,15 +199,15 @@ def test_watched_file_no_truncate_if_hidden():
     wf.update_line("line3\n")
     wf.update_line("line4\n")
     # one header, 4 lines
-    assert list(wf.last_lines) == ["line1\n", "line2\n", "line3\n", "line4\n"]
+    assert _lines(wf) == ["line1", "line2", "line3", "line4"]
     wf.update_line("line5\n")
     # one header, 4 lines
-    assert list(wf.last_lines) == ["line2\n", "line3\n", "line4\n", "line5\n"]
+    assert _lines(wf) == ["line2", "line3", "line4", "line5"]
     wf.set_size(total_size=0, max_errors=2, width=80)
     wf.update_line("line6\n")
     wf.update_line("line7\n")
     # no truncation
-    assert list(wf.last_lines) == ["line2\n", "line3\n", "line4\n", "line5\n", "line6\n", "line7\n"]
+    assert _lines(wf) == ["line2", "line3", "line4", "line5", "line6", "line7"]
 
 
 @pytest.mark.parametrize(
@@ -169,9 +274,7 @@ def test_watched_file_render(
         wf.update_line(line)
     table = MagicMock()
     wf.render(table)
-    for call, exp in zip(table.add_row.call_args_list, expected):
-        assert call[0][0] == exp
-    assert table.add_row.call_count == len(expected)
+    table.add_row.assert_called_once_with("\n".join(expected))
 
 
 @pytest.mark.parametrize(
@@ -197,22 +300,237 @@ def test_watched_file_render(
 def test_divide_screen(n_files, screen_size, expected):
     """Test divide_screen function"""
     result = divide_screen(n_files, screen_size)
-    assert result == expected
+    assert result == tuple(expected)
     if n_files > 0:
         assert sum(result) == screen_size
 
 
 def test_filter_most_recent():
     """Test filter_most_recent function"""
-    watched_files = OrderedDict(
-        [
-            (Path("a"), WatchedFile(path=Path("a"), last_modified=datetime.now())),
-            (Path("b"), WatchedFile(path=Path("c"), last_modified=datetime.now() - timedelta(seconds=2))),
-            (Path("c"), WatchedFile(path=Path("d"), last_modified=datetime.now() - timedelta(seconds=3))),
-            (Path("d"), WatchedFile(path=Path("b"), last_modified=datetime.now() - timedelta(seconds=1))),
+    now = time.time()
+    mtimes = {
+        Path("a"): now,
+        Path("b"): now - 2,
+        Path("c"): now - 3,
+        Path("d"): now - 1,
+    }
+    assert filter_most_recent(mtimes, 2) == [Path("a"), Path("d")]
+    assert filter_most_recent(mtimes, 3) == [Path("a"), Path("b"), Path("d")]
+    assert filter_most_recent(mtimes, 4) == [Path("a"), Path("b"), Path("c"), Path("d")]
+    assert filter_most_recent(mtimes, 5) == [Path("a"), Path("b"), Path("c"), Path("d")]
+
+
+@pytest.mark.parametrize(
+    "content, n, block_size, expected, rest",
+    [
+        ("", 3, 8192, [], ""),
+        ("line1\n", 3, 8192, ["line1\n"], ""),
+        ("line1\nline2\nline3\nline4\n", 3, 8192, ["line2\n", "line3\n", "line4\n"], ""),
+        ("line1\nline2\nline3\nline4", 3, 8192, ["line1\n", "line2\n", "line3\n"], "line4"),
+        ("line1\nline2\nline3\nline4\n", 3, 4, ["line2\n", "line3\n", "line4\n"], ""),
+        ("line1\nline2\nline3\nline4", 2, 4, ["line2\n", "line3\n"], "line4"),
+        ("line1\nline2\nline3\nline4\n", 10, 4, ["line1\n", "line2\n", "line3\n", "line4\n"], ""),
+        ("line1\r\nline2\r\n", 1, 8192, ["line2\n"], ""),
+        ("line1\rline2\rline3\r", 1, 8192, ["line2\n"], "line3\n"),
+        ("line1\nline2\n", 0, 8192, [], ""),
+    ]
+)
+def test_tail(content: str, n: int, block_size: int, expected: List[str], rest: str, tmp_path: Path):
+    """Test tail function"""
+    path = tmp_path / "test.log"
+    path.write_bytes(content.encode("utf-8"))
+    with open(path, "r") as fobj:
+        assert tail(fobj, n, block_size=block_size) == expected
+        # the file pointer is left at the start of the trailing partial line
+        assert fobj.read() == rest
+
+
+@pytest.mark.parametrize(
+    "data, expected, partial_line",
+    [
+        (b"", [], b""),
+        (b"partial", [], b"partial"),
+        (b"line1\nline2\n", ["line1\n", "line2\n"], b""),
+        (b"line1\nline2\npartial", ["line1\n", "line2\n"], b"partial"),
+        (b"line1\r\n", ["line1\n"], b""),
+        (b"progress 1\rprogress 2\r", ["progress 1\n", "progress 2\n"], b""),
+        # too long partial lines are not kept
+        (b"x" * (MAX_PARTIAL_LINE_SIZE + 1), ["x" * (MAX_PARTIAL_LINE_SIZE + 1)], b""),
+    ]
+)
+def test_split_complete_lines(data: bytes, expected: List[str], partial_line: bytes):
+    """Test split_complete_lines function"""
+    assert split_complete_lines(data, "utf-8") == (expected, partial_line)
+
+
+@pytest.mark.parametrize("use_ring", [True, False])
+def test_read_blocks(use_ring: bool, tmp_path: Path):
+    """Test read_blocks function, both with and without io_uring"""
+    ring = create_ring() if use_ring else None
+    if use_ring and ring is None:
+        pytest.skip("liburing not installed")
+    path_a = tmp_path / "a.log"
+    path_a.write_bytes(b"0123456789")
+    path_b = tmp_path / "b.log"
+    path_b.write_bytes(b"abcdef")
+    with open(path_a, "r") as fobj_a, open(path_b, "r") as fobj_b:
+        blocks = [(fobj_a.fileno(), 2, 3), (fobj_b.fileno(), 0, 6), (fobj_a.fileno(), 8, 5)]
+        assert read_blocks(blocks, ring=ring) == [b"234", b"abcdef", b"89"]
+        # more blocks than fit in the ring at once
+        assert read_blocks([(fobj_b.fileno(), 1, 1)] * 40, ring=ring) == [b"b"] * 40
+    close_ring(ring)
+
+
+def test_read_blocks_error():
+    """Test that a failed read raises, and does not affect later reads"""
+    ring = create_ring()
+    if ring is None:
+        pytest.skip("liburing not installed")
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    try:
+        with pytest.raises(OSError):
+            # reading from the write end of a pipe fails
+            read_blocks([(write_fd, 0, 1), (write_fd, 0, 1)], ring=ring)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        assert read_blocks([(devnull, 0, 1)], ring=ring) == [b""]
+        os.close(devnull)
+    finally:
+        os.close(write_fd)
+        close_ring(ring)
+
+
+def test_directory_watcher_init(tmp_path: Path):
+    """Test that DirectoryWatcher starts watching the existing files in sorted order"""
+    for name in ["b.log", "a.log", "c.log"]:
+        (tmp_path / name).write_text(f"{name}\n")
+    (tmp_path / "subdir").mkdir()
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        assert list(watcher.watched_files.keys()) == [tmp_path / "a.log", tmp_path / "b.log", tmp_path / "c.log"]
+        assert list(watcher.mtimes.keys()) == list(watcher.watched_files.keys())
+
+
+def test_directory_watcher_close(tmp_path: Path):
+    """Test that closing the watcher closes the watched files"""
+    (tmp_path / "a.log").write_text("foo\n")
+    watcher = DirectoryWatcher(tmp_path, n=3)
+    fobj = watcher.watched_files[tmp_path / "a.log"].fobj
+    watcher.close()
+    assert fobj is not None and fobj.closed
+    assert watcher.ring is None
+
+
+@pytest.mark.slow
+def test_directory_watcher_watch_idle(tmp_path: Path):
+    """Test that DirectoryWatcher.watch returns nothing when no files change"""
+    (tmp_path / "test.log").write_text("line1\n")
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        start = time.monotonic()
+        assert watcher.watch() == set()
+        assert time.monotonic() - start >= 0.9
+
+
+def test_directory_watcher_update_file(tmp_path: Path):
+    """Test that DirectoryWatcher.update_file reads complete lines and handles truncation"""
+    path = tmp_path / "test.log"
+    path.write_text("line1\n")
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        with open(path, "a") as writer:
+            writer.write("line2\nline3\npartial")
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path]) == ["line1", "line2", "line3"]
+        assert watcher.watched_files[path].last_modified == watcher.mtimes[path]
+        with open(path, "a") as writer:
+            writer.write(" line4\n")
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path])[-1] == "partial line4"
+        assert watcher.watched_files[path].last_lines[-1] == ("partial line4", False)
+        with open(path, "a") as writer:
+            writer.write("line5\nerror occurred\n")
+        watcher.update_file(path)
+        assert list(watcher.watched_files[path].last_lines)[-2:] == [("line5", False), ("error occurred", True)]
+        # a "\r\n" split between writes does not produce an empty line
+        with open(path, "a", newline="") as writer:
+            writer.write("line6\r")
+        watcher.update_file(path)
+        with open(path, "a", newline="") as writer:
+            writer.write("\nline7\n")
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path])[-2:] == ["line6", "line7"]
+        path.write_text("new\n")
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path])[-2:] == ["[yellow](file truncated)[/yellow]", "new"]
+        path.write_text("")
+        watcher.update_file(path)
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path])[-2:] == ["new", "[yellow](file truncated)[/yellow]"]
+
+
+def test_directory_watcher_partial_line_at_start(tmp_path: Path):
+    """Test that a partial line at the end of the initial tail is shown whole once completed"""
+    path = tmp_path / "test.log"
+    path.write_text("a\npart")
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        assert _lines(watcher.watched_files[path]) == ["a"]
+        with open(path, "a") as writer:
+            writer.write("ial\n")
+        watcher.update_file(path)
+        assert _lines(watcher.watched_files[path]) == ["a", "partial"]
+
+
+def test_directory_watcher_watch(tmp_path: Path):
+    """Test that DirectoryWatcher.watch picks up all pending writes"""
+    path = tmp_path / "test.log"
+    path.write_text("line1\n")
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        assert _lines(watcher.watched_files[path]) == ["line1"]
+        for i in range(2, 6):
+            with open(path, "a") as fobj:
+                fobj.write(f"line{i}\n")
+        new_path = tmp_path / "new.log"
+        new_path.write_text("new1\n")
+        assert watcher.watch() == {path, new_path}
+        wfile = watcher.watched_files[path]
+        assert _lines(wfile)[-3:] == ["line3", "line4", "line5"]
+        assert _lines(watcher.watched_files[new_path]) == ["new1"]
+
+
+def test_directory_watcher_replace_file(tmp_path: Path, tmp_path_factory: pytest.TempPathFactory):
+    """Test that DirectoryWatcher reopens a file that is replaced by moving another file over it"""
+    path = tmp_path / "test.log"
+    path.write_text("old1\n")
+    with DirectoryWatcher(tmp_path, n=3) as watcher:
+        old_fobj = watcher.watched_files[path].fobj
+        # moving the same file back in place does not reopen it
+        path.rename(tmp_path / "tmp.log")
+        (tmp_path / "tmp.log").rename(path)
+        watcher.watch()
+        assert watcher.watched_files[path].fobj is old_fobj
+        # the replacement is created outside of the watched directory
+        other = tmp_path_factory.mktemp("other") / "other.log"
+        other.write_text("new1\nnew2\n")
+        other.rename(path)
+        assert watcher.watch() == {path}
+        wfile = watcher.watched_files[path]
+        assert old_fobj is not None and old_fobj.closed
+        st = path.stat()
+        assert (wfile.device, wfile.inode) == (st.st_dev, st.st_ino)
+        assert _lines(wfile) == ["old1", "[yellow](file replaced)[/yellow]", "new1", "new2"]
+        # content appended just before the file is replaced, in the same drain, is not lost
+        with path.open("a") as f:
+            f.write("new3 last words\nunterminated")
+        newer = tmp_path_factory.mktemp("newer") / "newer.log"
+        newer.write_text("newer1\n")
+        newer.rename(path)
+        assert watcher.watch() == {path}
+        assert _lines(wfile) == [
+            "old1",
+            "[yellow](file replaced)[/yellow]",
+            "new1",
+            "new2",
+            "new3 last words",
+            "unterminated",
+            "[yellow](file replaced)[/yellow]",
+            "newer1",
         ]
-    )
-    assert filter_most_recent(watched_files, 2) == [Path("a"), Path("d")]
-    assert filter_most_recent(watched_files, 3) == [Path("a"), Path("b"), Path("d")]
-    assert filter_most_recent(watched_files, 4) == [Path("a"), Path("b"), Path("c"), Path("d")]
-    assert filter_most_recent(watched_files, 5) == [Path("a"), Path("b"), Path("c"), Path("d")]
+        assert wfile.partial_line == b""